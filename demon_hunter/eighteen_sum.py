@@ -3,10 +3,53 @@
 """
 This is a variation of the sudoku square, where you have numbers 2-10 and the
 totals need to add up to 18 in all directions.
+
+Other sizes of square work too: pass a bigger starting config (0 for an empty
+square), along with the numbers that can be used and the total that every
+row, column and diagonal needs to add up to. For example, a 4x4 square using
+1-16 that adds up to 34:
+
+    solve([[0] * 4 for _ in range(4)], numbers=set(range(1, 17)), target=34)
+
+There are a few engines to choose from when solving:
+
+    dfs        Fills in the first empty square, depth first (the default)
+    numpy      Fills in one empty square at a time for a whole batch of
+               candidates at once, keeping the candidates as rows of a NumPy
+               array. All the row, column and diagonal sums of every
+               candidate are checked with a single matrix multiplication.
+               Batches are searched depth first, so memory stays within a
+               few batches (see NUMPY_BATCH_SIZE) for each empty square.
+               Requires numpy to be installed.
+    propagate  Only tries numbers that can still make every line through a
+               square add up (the rest of the line has to be fillable from
+               the smallest and largest numbers left), and always fills in
+               the square with the fewest numbers left to try. A square that
+               is the last empty one in a line only has one number to try.
+               This is the one to use for anything bigger than 3x3.
+    sat        Turns the puzzle into clauses for the SAT solver in
+               sat_solver.py: one true/false variable for each number in each
+               square, plus one for each running total along each line, so
+               that a line's total is forced as its squares are filled in.
+
+Every engine is a function that takes the starting config, numbers and target,
+and returns the filled-in square (or None). To add another one, add it to
+ENGINES, then time them against each other for the size of puzzle you have.
+
+To skip solving puzzles that have been solved before, pass a cache (like the
+SolutionCache in solution_cache.py, at the top of the repo). Solutions are
+saved to it and looked up by the starting config, engine, numbers and target.
+
+Run it with ``python eighteen_sum.py [engine]``.
 """
 
 import random
+import sys
+from bisect import bisect_left, bisect_right
 from copy import deepcopy
+from math import inf
+
+from sat_solver import SatSolver
 
 # This is the game's default config for the puzzle
 DEFAULT_CONFIG = [
@@ -16,19 +59,76 @@ DEFAULT_CONFIG = [
 ]
 
 NUMBERS = set(range(2, 11))
+TARGET = 18
+
+# The most candidates the 'numpy' engine fills in a square for at once. Each
+# one is copied once for every number, so this (times the size of the square)
+# is how much memory it needs for each empty square.
+NUMPY_BATCH_SIZE = 4096
+
+# Where solve() keeps its entries in a solution_cache.SolutionCache
+CACHE_NAMESPACE = 'eighteen_sum'
+CACHE_VERSION = 1
+
+
+def solve(starting_config, engine='dfs', numbers=NUMBERS, target=TARGET,
+          cache=None):
+    size = len(starting_config)
+
+    def _format_number(num):
+        if num < 10:
+            return " {}".format(num)
+        return "{}".format(num)
+
+    def _print_solution(square_config):
+        if not square_config:
+            print("No solution was found")
+        else:
+            print("+" + "--+" * size)
+            for row in square_config:
+                line = "|"
+                for column in row:
+                    line += _format_number(column) + "|"
+                print(line)
+            print("+" + "--+" * size)
 
+    if engine not in ENGINES:
+        raise ValueError("Unknown engine: {}".format(engine))
+
+    if cache is None:
+        solution = ENGINES[engine](starting_config, numbers, target)
+    else:
+        cache_key = {
+            'config': starting_config,
+            'engine': engine,
+            'numbers': sorted(numbers),
+            'target': target,
+        }
+        # Wrapped up, since a cache can't tell a saved None from a miss
+        cached = cache.get(CACHE_NAMESPACE, CACHE_VERSION, cache_key)
+        if cached is None:
+            cached = {
+                'solution': ENGINES[engine](starting_config, numbers, target),
+            }
+            cache.put(CACHE_NAMESPACE, CACHE_VERSION, cache_key, cached)
+        solution = cached['solution']
+
+    _print_solution(solution)
+
+
+def _solve_with_dfs(starting_config, numbers, target):
+    size = len(starting_config)
 
-def solve(starting_config):
     def _check_diagonals(square_config):
         diags = [
-            [square_config[0][0], square_config[1][1], square_config[2][2]],
-            [square_config[0][2], square_config[1][1], square_config[2][0]],
+            [square_config[idx][idx] for idx in range(size)],
+            [square_config[idx][size - 1 - idx] for idx in range(size)],
         ]
         return _check_horizontals(diags)
 
     def _check_horizontals(square_config):
         return all([
-            all(row) and sum(row) == 18
+            all(row) and sum(row) == target
             for row in square_config
         ])
 
@@ -39,11 +139,6 @@ def solve(starting_config):
         ]
         return _check_horizontals(columns)
 
-    def _format_number(num):
-        if num < 10:
-            return " {}".format(num)
-        return "{}".format(num)
-
     def _generate_next_solutions(square_config):
         unused_numbers = _get_unused_numbers(square_config)
 
@@ -70,7 +165,7 @@ def solve(starting_config):
         for row in square_config:
             used = used.union(set(row))
         used = used.difference({0})
-        return NUMBERS.difference(used)
+        return set(numbers).difference(used)
 
     def _is_solved(list_of_solutions):
         for potential_solution in list_of_solutions:
@@ -83,18 +178,6 @@ def solve(starting_config):
 
         return None
 
-    def _print_solution(square_config):
-        if not square_config:
-            print("No solution was found")
-        else:
-            print("+--+--+--+")
-            for row in square_config:
-                line = "|"
-                for column in row:
-                    line += _format_number(column) + "|"
-                print(line)
-            print("+--+--+--+")
-
     queue = [starting_config]
     solution = None
 
@@ -106,8 +189,409 @@ def solve(starting_config):
         if not solution:
             queue.extend(next_solutions)
 
-    _print_solution(solution)
+    return solution
+
+
+def _lines(size):
+    """
+    The squares in every row, column and diagonal of the square (squares are
+    numbered left-to-right, top-to-bottom)
+    """
+    lines = []
+    for row in range(size):
+        lines.append([row * size + column for column in range(size)])
+    for column in range(size):
+        lines.append([row * size + column for row in range(size)])
+    lines.append([idx * size + idx for idx in range(size)])
+    lines.append([idx * size + (size - 1 - idx) for idx in range(size)])
+    return lines
+
+
+def _line_incidence(size):
+    """
+    One row per row, column and diagonal of the square, with a 1 in each
+    column for a square that is part of that line
+    """
+    lines = _lines(size)
+    incidence = [[0] * (size * size) for _ in lines]
+    for line_number, squares in enumerate(lines):
+        for square in squares:
+            incidence[line_number][square] = 1
+    return incidence
+
+
+def _solve_with_numpy(starting_config, numbers, target):
+    """
+    Candidates are rows of an array, in batches of at most NUMPY_BATCH_SIZE.
+    For the next empty square, every candidate in a batch is copied once per
+    number, the number is placed in that square, and any copy that used a
+    number twice or has a line that can't add up to TARGET is thrown out. What
+    is left is split back up into batches, and the first of those is taken
+    on to the next empty square before the rest, so only a few batches for
+    each empty square are ever kept at once.
+    """
+    import numpy
+
+    size = len(starting_config)
+    numbers = numpy.array(sorted(numbers))
+    incidence = numpy.array(_line_incidence(size)).T
+
+    start = numpy.array([starting_config]).reshape(1, size * size)
+    empty_squares = numpy.flatnonzero(start[0] == 0)
+
+    # Batches still to be searched, and how many empty squares have been
+    # filled in for each one
+    batches = [(start, 0)]
+    while batches:
+        candidates, filled_in = batches.pop()
+        if filled_in == len(empty_squares):
+            if (candidates[0] @ incidence == target).all():
+                return candidates[0].reshape(size, size).tolist()
+            continue
+
+        square = empty_squares[filled_in]
+        # Every candidate with every number, shape (candidates, numbers)
+        is_unused = ~(candidates[:, :, None] == numbers).any(axis=1)
+        candidate_rows, number_columns = numpy.nonzero(is_unused)
+
+        candidates = candidates[candidate_rows]
+        candidates[:, square] = numbers[number_columns]
+
+        # Lines can't go over the target, and full lines have to hit it
+        sums = candidates @ incidence
+        filled = (candidates != 0) @ incidence
+        is_possible = (
+            (sums <= target) & ((filled < size) | (sums == target))
+        ).all(axis=1)
+        candidates = candidates[is_possible]
+
+        # Last batch on first, so the first one is taken off next
+        for batch_start in reversed(range(0, len(candidates), NUMPY_BATCH_SIZE)):
+            batches.append((
+                candidates[batch_start:batch_start + NUMPY_BATCH_SIZE],
+                filled_in + 1,
+            ))
+
+    return None
+
+
+def find_solutions(starting_config, numbers=NUMBERS, target=TARGET):
+    """
+    Generates every way of filling in the starting config, using the same
+    search as the 'propagate' engine
+    """
+    yield from _propagate(starting_config, numbers, target)
+
+
+def count_solutions(starting_config, numbers=NUMBERS, target=TARGET):
+    """
+    Counts every way of filling in the starting config.
+
+    If the starting config looks the same after being rotated or flipped (an
+    empty square does, for example), then every solution comes in a group of
+    8 that are just rotations and flips of each other. In that case only the
+    one with the smallest number in the top-left corner, and a smaller number
+    in the top-right corner than the bottom-left, is searched for.
+    """
+    size = len(starting_config)
+    if size < 2 or any(
+        symmetry != starting_config
+        for symmetry in _symmetries(starting_config)
+    ):
+        return sum(1 for _ in _propagate(starting_config, numbers, target))
+
+    top_left, top_right = 0, size - 1
+    bottom_left, bottom_right = size * (size - 1), size * size - 1
+    smaller_than = [
+        (top_left, top_right),
+        (top_left, bottom_left),
+        (top_left, bottom_right),
+        (top_right, bottom_left),
+    ]
+    solutions = _propagate(starting_config, numbers, target, smaller_than)
+    return 8 * sum(1 for _ in solutions)
+
+
+def _symmetries(square_config):
+    """
+    The 8 rotations and flips of a square
+    """
+    symmetries = []
+    rotated = square_config
+    for _ in range(4):
+        rotated = [list(row) for row in zip(*rotated[::-1])]
+        symmetries.append(rotated)
+        symmetries.append([row[::-1] for row in rotated])
+    return symmetries
+
+
+def _solve_with_propagation(starting_config, numbers, target):
+    return next(_propagate(starting_config, numbers, target), None)
+
+
+def _propagate(starting_config, numbers, target, smaller_than=()):
+    """
+    Depth-first, but each step fills in whichever empty square has the fewest
+    numbers that could still go there, and backtracks as soon as any empty
+    square has none. Generates every solution.
+
+    smaller_than is a list of pairs of squares (numbered left-to-right,
+    top-to-bottom), where the first square has to end up with a smaller
+    number than the second.
+
+    Nothing is copied while searching: the sum and number of empty squares of
+    every line, the empty squares, the unused numbers (smallest first) and
+    their running totals are all updated as each number is placed and taken
+    back out again.
+    """
+    size = len(starting_config)
+    squares = [value for row in starting_config for value in row]
+    lines = _lines(size)
+    lines_through = [
+        [line_number for line_number, line in enumerate(lines) if square in line]
+        for square in range(size * size)
+    ]
+    smaller_through = [
+        [pair for pair in smaller_than if square in pair]
+        for square in range(size * size)
+    ]
+
+    line_sums = [sum(squares[square] for square in line) for line in lines]
+    line_empty = [
+        sum(1 for square in line if squares[square] == 0) for line in lines
+    ]
+    empty_squares = [
+        square for square, value in enumerate(squares) if value == 0
+    ]
+    unused = sorted(set(numbers).difference(squares))
+    # totals[k] is the sum of the k smallest unused numbers
+    totals = [0]
+    for number in unused:
+        totals.append(totals[-1] + number)
+
+    def _place(empty_idx, position):
+        """
+        Puts the unused number at position into the empty square at empty_idx
+        """
+        square = empty_squares.pop(empty_idx)
+        number = unused.pop(position)
+        del totals[position + 1]
+        for k in range(position + 1, len(totals)):
+            totals[k] -= number
+
+        squares[square] = number
+        for line_number in lines_through[square]:
+            line_sums[line_number] += number
+            line_empty[line_number] -= 1
+
+    def _unplace(empty_idx, square, position, number):
+        empty_squares.insert(empty_idx, square)
+        unused.insert(position, number)
+        for k in range(position + 1, len(totals)):
+            totals[k] += number
+        totals.insert(position + 1, totals[position] + number)
+
+        squares[square] = 0
+        for line_number in lines_through[square]:
+            line_sums[line_number] -= number
+            line_empty[line_number] += 1
+
+    # The smallest and largest number that could go into each line, set by
+    # _bound_lines for the empty squares at the current step
+    line_lowest = [0] * len(lines)
+    line_highest = [0] * len(lines)
+
+    def _bound_lines():
+        """
+        The rest of a line has to be filled in with other unused numbers, so
+        it adds up to somewhere between the smallest and largest of those,
+        which limits what the number going in can be. If the smallest (or
+        largest) of the others would have had to include that number, and
+        the line still can't add up, then no number fits at all.
+        """
+        count = len(unused)
+        for line_number in range(len(lines)):
+            still_empty = line_empty[line_number] - 1
+            if still_empty < 0:
+                continue
+
+            room = target - line_sums[line_number]
+            if still_empty == 0:
+                lowest = highest = room
+            elif count - 1 < still_empty:
+                lowest, highest = inf, -inf
+            else:
+                highest = room - totals[still_empty]
+                lowest = room - (totals[count] - totals[count - still_empty])
+                if (unused[still_empty] > highest or
+                        unused[count - still_empty - 1] < lowest):
+                    lowest, highest = inf, -inf
+            line_lowest[line_number] = lowest
+            line_highest[line_number] = highest
+
+    def _search():
+        if not empty_squares:
+            if all(line_sum == target for line_sum in line_sums):
+                yield [
+                    squares[row * size:(row + 1) * size]
+                    for row in range(size)
+                ]
+            return
+
+        # Find the empty square with the fewest numbers that could go there.
+        # Those are the unused numbers between the highest lowest and the
+        # lowest highest of its lines, and the first square with one number
+        # or none is as good as it gets.
+        _bound_lines()
+        best_idx, best_start, best_end = None, 0, 0
+        for empty_idx in range(len(empty_squares)):
+            square = empty_squares[empty_idx]
+            lowest, highest = -inf, inf
+            for line_number in lines_through[square]:
+                if line_lowest[line_number] > lowest:
+                    lowest = line_lowest[line_number]
+                if line_highest[line_number] < highest:
+                    highest = line_highest[line_number]
+            for smaller, larger in smaller_through[square]:
+                if square == smaller and squares[larger]:
+                    highest = min(highest, squares[larger])
+                if square == larger and squares[smaller]:
+                    lowest = max(lowest, squares[smaller])
+
+            start = bisect_left(unused, lowest)
+            end = bisect_right(unused, highest)
+            if best_idx is None or end - start < best_end - best_start:
+                best_idx, best_start, best_end = empty_idx, start, end
+                if end - start <= 1:
+                    break
+
+        # Every placement is taken back out before the next one, so unused is
+        # the same at each position as it was when the square was picked
+        square = empty_squares[best_idx]
+        for position in range(best_start, best_end):
+            number = unused[position]
+            _place(best_idx, position)
+            yield from _search()
+            _unplace(best_idx, square, position, number)
+
+    yield from _search()
+
+
+def _solve_with_sat(starting_config, numbers, target):
+    """
+    Variables: square_vars[square][number] is true when that number is in
+    that square, and totals[k][total] is true when the first k + 1 squares of
+    a line add up to that total. Each square in a line pushes the running
+    total along, and once the total before the last square is known, the
+    last square has to make up the difference.
+    """
+    size = len(starting_config)
+    squares = [value for row in starting_config for value in row]
+    all_numbers = sorted(set(numbers).union(squares).difference({0}))
+    smallest = all_numbers[0]
+    solver = SatSolver()
+
+    square_vars = [
+        {number: solver.new_var() for number in all_numbers}
+        for _ in squares
+    ]
+
+    for square, value in enumerate(squares):
+        if value:
+            solver.add_clause([square_vars[square][value]])
+
+        # Exactly one number per square
+        solver.add_clause(square_vars[square].values())
+        for first, second in _pairs(list(square_vars[square].values())):
+            solver.add_clause([-first, -second])
+
+    # Each number used no more than once (and exactly once, if every number
+    # has to be used)
+    for number in all_numbers:
+        number_vars = [
+            square_vars[square][number] for square in range(len(squares))
+        ]
+        for first, second in _pairs(number_vars):
+            solver.add_clause([-first, -second])
+        if len(all_numbers) == len(squares):
+            solver.add_clause(number_vars)
+
+    for line in _lines(size):
+        if size == 1:
+            # No running total, the only square is the whole line
+            for number in all_numbers:
+                if number != target:
+                    solver.add_clause([-square_vars[line[0]][number]])
+            continue
+
+        # The most a running total can be and still leave room for the rest
+        # of the line
+        highest = [target - smallest * (size - 1 - k) for k in range(size)]
+        totals = [{} for _ in range(size - 1)]
+        for number in all_numbers:
+            if number <= highest[0]:
+                totals[0][number] = solver.new_var()
+                solver.add_clause([
+                    -square_vars[line[0]][number],
+                    totals[0][number],
+                ])
+            else:
+                solver.add_clause([-square_vars[line[0]][number]])
+
+        for k in range(1, size - 1):
+            for total, total_var in totals[k - 1].items():
+                for number in all_numbers:
+                    number_var = square_vars[line[k]][number]
+                    new_total = total + number
+                    if new_total > highest[k]:
+                        solver.add_clause([-total_var, -number_var])
+                        continue
+                    if new_total not in totals[k]:
+                        totals[k][new_total] = solver.new_var()
+                    solver.add_clause([
+                        -total_var,
+                        -number_var,
+                        totals[k][new_total],
+                    ])
+
+        last_square = square_vars[line[-1]]
+        for total, total_var in totals[-1].items():
+            difference = target - total
+            if difference in last_square:
+                solver.add_clause([-total_var, last_square[difference]])
+            else:
+                solver.add_clause([-total_var])
+
+    model = solver.solve()
+    if model is None:
+        return None
+
+    solution = [
+        next(
+            number for number, var in square_vars[square].items()
+            if model[var]
+        )
+        for square in range(len(squares))
+    ]
+    return [solution[row * size:(row + 1) * size] for row in range(size)]
+
+
+def _pairs(items):
+    return [
+        (first, second)
+        for idx, first in enumerate(items)
+            for second in items[idx + 1:]
+    ]
+
+
+# The engines that solve() can use, by name
+ENGINES = {
+    'dfs': _solve_with_dfs,
+    'numpy': _solve_with_numpy,
+    'propagate': _solve_with_propagation,
+    'sat': _solve_with_sat,
+}
 
 
 if __name__ == '__main__':
-   solve(DEFAULT_CONFIG)
+   solve(DEFAULT_CONFIG, *sys.argv[1:2])
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+
+"""
+A small CDCL (conflict-driven clause learning) SAT solver, so that the sum
+puzzles can be handed off to a SAT solver without installing anything.
+
+Variables are numbered from 1, and a literal is a variable number that is
+negative when the variable has to be false (the same as the DIMACS format).
+For example, to say "x1 or not x2":
+
+    solver = SatSolver()
+    x1, x2 = solver.new_var(), solver.new_var()
+    solver.add_clause([x1, -x2])
+    solver.solve()  # {1: True, 2: False}, or None if it can't be satisfied
+
+It does the usual things: two watched literals per clause for unit
+propagation, learning a clause from the first unique implication point of each
+conflict and jumping back to where it becomes unit, picking the variables that
+have been in the most recent conflicts (with their last value), and restarting
+now and then. Learned clauses are never thrown away, so it's meant for
+puzzle-sized problems rather than industrial ones.
+"""
+
+import heapq
+from typing import Dict, Iterable, List, Optional
+
+Clause = List[int]
+Model = Dict[int, bool]
+
+# How much the variable activities decay after each conflict
+ACTIVITY_DECAY = 0.95
+# Conflicts before the first restart, and how much that grows each time
+RESTART_INTERVAL = 100
+RESTART_GROWTH = 1.5
+
+
+class SatSolver:
+    def __init__(self):
+        self.num_vars: int = 0
+        self._clauses: List[Clause] = []
+
+        # Internal use during solve()
+        self._values: List[int] = []  # 1 for true, -1 for false, 0 for unset
+        self._levels: List[int] = []
+        self._reasons: List[Optional[Clause]] = []
+        self._activity: List[float] = []
+        self._activity_increment: float = 1.0
+        self._phases: List[int] = []
+        self._watches: List[List[Clause]] = []
+        self._trail: List[int] = []
+        self._trail_limits: List[int] = []
+        self._queue_head: int = 0
+        self._order: List = []
+
+    def new_var(self) -> int:
+        self.num_vars += 1
+        return self.num_vars
+
+    def add_clause(self, literals: Iterable[int]):
+        self._clauses.append(list(literals))
+
+    def solve(self) -> Optional[Model]:
+        """
+        Returns a value for every variable that satisfies all the clauses, or
+        None if there isn't one
+        """
+        size = self.num_vars + 1
+        self._values = [0] * size
+        self._levels = [0] * size
+        self._reasons = [None] * size
+        self._activity = [0.0] * size
+        self._activity_increment = 1.0
+        # Guessing false first suits "exactly one of these" style clauses
+        self._phases = [-1] * size
+        # Indexed by literal; negative literals land in the top half
+        self._watches = [[] for _ in range(2 * size)]
+        self._trail = []
+        self._trail_limits = []
+        self._queue_head = 0
+
+        for clause in self._clauses:
+            clause = list(dict.fromkeys(clause))
+            if any(-literal in clause for literal in clause):
+                continue
+            if not clause:
+                return None
+            if len(clause) == 1:
+                value = self._value(clause[0])
+                if value < 0:
+                    return None
+                if value == 0:
+                    self._assign(clause[0], None)
+                continue
+            self._attach(clause)
+
+        if self._propagate() is not None:
+            return None
+
+        self._order = [(0.0, var) for var in range(1, size)]
+        heapq.heapify(self._order)
+
+        conflicts = 0
+        restart_at = RESTART_INTERVAL
+        while True:
+            conflict = self._propagate()
+            if conflict is not None:
+                if not self._trail_limits:
+                    return None
+
+                learned, back_level = self._analyze(conflict)
+                self._backtrack(back_level)
+                if len(learned) == 1:
+                    self._assign(learned[0], None)
+                else:
+                    self._attach(learned)
+                    self._assign(learned[0], learned)
+                self._activity_increment /= ACTIVITY_DECAY
+
+                conflicts += 1
+                if conflicts >= restart_at:
+                    self._backtrack(0)
+                    conflicts = 0
+                    restart_at = int(restart_at * RESTART_GROWTH)
+                continue
+
+            var = self._pick_branch_var()
+            if var is None:
+                return {
+                    var: self._values[var] > 0
+                    for var in range(1, size)
+                }
+
+            self._trail_limits.append(len(self._trail))
+            self._assign(var * self._phases[var], None)
+
+    def _analyze(self, conflict: Clause):
+        """
+        Work back from a conflict through the clauses that forced each
+        assignment, until only one literal from the latest decision level is
+        left. Returns the learned clause (with that literal first, and the
+        literal from the next-latest level second) and the level to jump
+        back to.
+        """
+        current_level = len(self._trail_limits)
+        seen = set()
+        learned = [0]
+        at_current_level = 0
+        index = len(self._trail) - 1
+        literal = None
+        clause = conflict
+
+        while True:
+            for other in clause:
+                if other == literal:
+                    continue
+                var = abs(other)
+                if var in seen or self._levels[var] == 0:
+                    continue
+                seen.add(var)
+                self._bump(var)
+                if self._levels[var] == current_level:
+                    at_current_level += 1
+                else:
+                    learned.append(other)
+
+            while abs(self._trail[index]) not in seen:
+                index -= 1
+            literal = self._trail[index]
+            index -= 1
+            at_current_level -= 1
+            if at_current_level == 0:
+                break
+            clause = self._reasons[abs(literal)]
+
+        learned[0] = -literal
+        if len(learned) == 1:
+            return learned, 0
+
+        latest = max(
+            range(1, len(learned)),
+            key=lambda idx: self._levels[abs(learned[idx])],
+        )
+        learned[1], learned[latest] = learned[latest], learned[1]
+        return learned, self._levels[abs(learned[1])]
+
+    def _assign(self, literal: int, reason: Optional[Clause]):
+        var = abs(literal)
+        self._values[var] = 1 if literal > 0 else -1
+        self._levels[var] = len(self._trail_limits)
+        self._reasons[var] = reason
+        self._trail.append(literal)
+
+    def _attach(self, clause: Clause):
+        self._watches[clause[0]].append(clause)
+        self._watches[clause[1]].append(clause)
+
+    def _backtrack(self, level: int):
+        if len(self._trail_limits) <= level:
+            return
+
+        start = self._trail_limits[level]
+        for literal in self._trail[start:]:
+            var = abs(literal)
+            self._phases[var] = 1 if literal > 0 else -1
+            self._values[var] = 0
+            self._reasons[var] = None
+            heapq.heappush(self._order, (-self._activity[var], var))
+
+        del self._trail[start:]
+        del self._trail_limits[level:]
+        self._queue_head = len(self._trail)
+
+    def _bump(self, var: int):
+        self._activity[var] += self._activity_increment
+        if self._activity[var] > 1e100:
+            self._activity = [activity * 1e-100 for activity in self._activity]
+            self._activity_increment *= 1e-100
+            self._order = [
+                (-self._activity[var], var)
+                for var in range(1, self.num_vars + 1)
+                if self._values[var] == 0
+            ]
+            heapq.heapify(self._order)
+        elif self._values[var] == 0:
+            heapq.heappush(self._order, (-self._activity[var], var))
+
+    def _pick_branch_var(self) -> Optional[int]:
+        while self._order:
+            _, var = heapq.heappop(self._order)
+            if self._values[var] == 0:
+                return var
+        return None
+
+    def _propagate(self) -> Optional[Clause]:
+        """
+        Assign every literal that is the last one left unset in a clause.
+        Returns a clause with every literal false, if there is one.
+        """
+        while self._queue_head < len(self._trail):
+            false_literal = -self._trail[self._queue_head]
+            self._queue_head += 1
+
+            watchers = self._watches[false_literal]
+            still_watching = []
+            for idx, clause in enumerate(watchers):
+                # Keep the literal that just became false in second place
+                if clause[0] == false_literal:
+                    clause[0], clause[1] = clause[1], clause[0]
+                first = clause[0]
+                if self._value(first) > 0:
+                    still_watching.append(clause)
+                    continue
+
+                for other_idx in range(2, len(clause)):
+                    if self._value(clause[other_idx]) >= 0:
+                        clause[1], clause[other_idx] = (
+                            clause[other_idx],
+                            clause[1],
+                        )
+                        self._watches[clause[1]].append(clause)
+                        break
+                else:
+                    still_watching.append(clause)
+                    if self._value(first) < 0:
+                        still_watching.extend(watchers[idx + 1:])
+                        self._watches[false_literal] = still_watching
+                        self._queue_head = len(self._trail)
+                        return clause
+                    self._assign(first, clause)
+
+            self._watches[false_literal] = still_watching
+
+        return None
+
+    def _value(self, literal: int) -> int:
+        value = self._values[abs(literal)]
+        return value if literal > 0 else -value
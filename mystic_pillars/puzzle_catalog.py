@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+# REQUIRES PYTHON >= 3.8
+
+"""
+Puzzle catalogs: lots of puzzles saved in one file, that can be loaded one at
+a time instead of all at once (the way puzzle_config.py has to be).
+
+## Format:
+
+One puzzle per line, as the puzzle number, a tab, and then the puzzle as JSON.
+Rather than repeating the pillar numbers everywhere, the JSON lists them once,
+and then gives the stone counts and the distances between pillars in the same
+order. For the example in puzzle_config.py:
+
+    0	{"max_turns": 2, "pillars": [1, 2, 3], "initial": [1, 1, 1], "goal": [0, 0, 3], "distances": [[0, 1, 2], [1, 0, 1], [2, 1, 0]]}
+
+Blank lines, and lines starting with ``#``, are skipped.
+
+## How to use it:
+
+    catalog = PuzzleCatalog('puzzles.jsonl')
+    solve(catalog[22])
+
+Opening a catalog only reads as far as each puzzle number (to find where each
+puzzle is in the file). A puzzle is read, checked, and turned back into a
+PuzzleConfig when it's asked for. A PuzzleCatalog can be used anywhere a
+MultiplePuzzleConfig can be, like ``solve_all()``.
+
+To turn puzzle_config.py into a catalog:
+
+    python puzzle_catalog.py puzzles.jsonl
+
+"""
+
+import json
+import sys
+from typing import Dict, Iterator, List, Mapping
+
+from puzzle_types import MultiplePuzzleConfig, PuzzleConfig
+
+
+###############################################################################
+
+class PuzzleCatalog(Mapping[int, PuzzleConfig]):
+    def __init__(self, path: str):
+        self.path: str = path
+
+        # Where each puzzle's line starts in the file
+        self._offsets: Dict[int, int] = {}
+        with open(path, 'rb') as catalog_file:
+            offset = 0
+            for line_number, line in enumerate(catalog_file, start=1):
+                if line.strip() and not line.startswith(b'#'):
+                    number, tab, _ = line.partition(b'\t')
+                    try:
+                        puzzle_number = int(number)
+                    except ValueError:
+                        puzzle_number = None
+                    if puzzle_number is None or not tab:
+                        raise ValueError(
+                            f'{path}:{line_number}: expected a puzzle number, '
+                            f'a tab, and then the puzzle',
+                        )
+                    if puzzle_number in self._offsets:
+                        raise ValueError(
+                            f'{path}:{line_number}: puzzle #{puzzle_number} '
+                            f'is in the catalog twice',
+                        )
+                    self._offsets[puzzle_number] = offset
+                offset += len(line)
+
+    def __getitem__(self, puzzle_number: int) -> PuzzleConfig:
+        offset = self._offsets[puzzle_number]
+        with open(self.path, 'rb') as catalog_file:
+            catalog_file.seek(offset)
+            line = catalog_file.readline()
+
+        _, _, puzzle_json = line.partition(b'\t')
+        try:
+            puzzle = json.loads(puzzle_json)
+        except ValueError as error:
+            raise ValueError(f'Puzzle #{puzzle_number}: {error}') from None
+        return _expand_puzzle(puzzle_number, puzzle)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._offsets)
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+
+def dump_catalog(puzzles: MultiplePuzzleConfig, path: str):
+    """
+    Saves the puzzles to a catalog file, in order of puzzle number
+    """
+    with open(path, 'w') as catalog_file:
+        for puzzle_number in sorted(puzzles):
+            puzzle_config = puzzles[puzzle_number]
+            puzzle = {
+                'max_turns': puzzle_config['max_turns'],
+                'pillars': [label for label, _ in puzzle_config['initial']],
+                'initial': [count for _, count in puzzle_config['initial']],
+                'goal': [count for _, count in puzzle_config['goal']],
+                'distances': [
+                    [distance for _, distance in row]
+                    for row in puzzle_config['config']
+                ],
+            }
+            # Round-trip it, so a catalog never has a puzzle it can't load
+            _expand_puzzle(puzzle_number, puzzle)
+            catalog_file.write(f'{puzzle_number}\t{json.dumps(puzzle)}\n')
+
+
+def _expand_puzzle(puzzle_number: int, puzzle: Dict) -> PuzzleConfig:
+    """
+    Checks a puzzle from a catalog, and turns it back into a PuzzleConfig
+    """
+    def _fail(reason: str):
+        raise ValueError(f'Puzzle #{puzzle_number}: {reason}')
+
+    # bool is a subclass of int, but true isn't a number of stones
+    def _is_whole_number(value) -> bool:
+        return isinstance(value, int) and not isinstance(value, bool)
+
+    if not isinstance(puzzle, dict):
+        _fail('has to be a JSON object')
+    for key in ('max_turns', 'pillars', 'initial', 'goal', 'distances'):
+        if key not in puzzle:
+            _fail(f'missing {key}')
+        if key != 'max_turns' and not isinstance(puzzle[key], list):
+            _fail(f'{key} has to be a list')
+
+    max_turns = puzzle['max_turns']
+    labels: List[int] = puzzle['pillars']
+    distances: List[List[int]] = puzzle['distances']
+    if not _is_whole_number(max_turns) or max_turns < 0:
+        _fail('max_turns has to be a whole number of turns')
+    if not all(_is_whole_number(label) for label in labels):
+        _fail('pillar numbers have to be whole numbers')
+    if len(set(labels)) != len(labels):
+        _fail('pillar numbers have to be unique')
+
+    pillar_count = len(labels)
+    for key in ('initial', 'goal'):
+        counts = puzzle[key]
+        if len(counts) != pillar_count:
+            _fail(f'{key} has {len(counts)} pillars instead of {pillar_count}')
+        if any(not _is_whole_number(count) or count < 0 for count in counts):
+            _fail(f'{key} has to be whole numbers of stones')
+    if len(distances) != pillar_count or any(
+            not isinstance(row, list) or len(row) != pillar_count
+            for row in distances):
+        _fail(f'distances has to be {pillar_count} by {pillar_count}')
+    if any(not _is_whole_number(distance)
+           for row in distances for distance in row):
+        _fail('distances have to be whole numbers of hops')
+    if any(distances[idx][idx] != 0 for idx in range(pillar_count)):
+        _fail('the distance from a pillar to itself has to be 0')
+
+    puzzle_config: PuzzleConfig = {
+        'max_turns': max_turns,
+        'initial': tuple(zip(labels, puzzle['initial'])),
+        'goal': tuple(zip(labels, puzzle['goal'])),
+        'config': tuple(tuple(zip(labels, row)) for row in distances),
+    }
+    return puzzle_config
+
+
+
+
+###############################################################################
+
+if __name__ == '__main__':
+    from puzzle_config import PUZZLES
+
+    dump_catalog(PUZZLES, sys.argv[1])
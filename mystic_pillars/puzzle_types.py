@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+
+# REQUIRES PYTHON >= 3.8
+
+"""
+The types that describe a puzzle, kept apart from solve.py so that loading
+puzzles (see puzzle_catalog.py) doesn't mean loading the whole solver.
+"""
+
+from typing import Dict, Tuple, TypedDict
+
+
+# Iterable of tuples describing the layout of the current board. First number in
+# the tuple is the column number; second number is the number of stones sitting
+# on the column.
+Pillar = Tuple[int, int]
+BoardPositions = Tuple[Pillar]
+
+# Iterable of tuples describing distance to each of the pillars relative to another
+# pillar. First number of the tuple is the column number to move stones to;
+# second number is the distance (number of hops) stones must be moved to reach
+# that pillar. If the distance is 0, then the stones are either already at the
+# pillar, or the pillar is unreachable.
+PillarDistance = Tuple[Tuple[int, int]]
+
+class PuzzleConfig(TypedDict):
+    max_turns: int
+    initial: BoardPositions
+    goal: BoardPositions
+    config: Tuple[PillarDistance]
+
+# Dictionary of puzzle configurations. The key is the number of the puzzle
+MultiplePuzzleConfig = Dict[int, PuzzleConfig]
@@ -11,58 +11,276 @@ Solver for the Mystic Pillars video game.
   2. Save, and run the script.
   3. The output shows you how many stones to shift to which pillars.
 
-"""
+## Search modes:
+
+  * dfs: depth-first (the default). Usually quick, but the first solution it
+    finds isn't necessarily the shortest one.
+  * bfs: breadth-first. Always finds a solution with the fewest moves, but
+    keeps every board at the current depth in memory.
+  * iddfs: iterative deepening. Depth-first searches allowing 1 more move each
+    time, so it also finds a solution with the fewest moves, with the memory
+    use of dfs.
+  * meet_in_middle: searches half of max_turns forward from the initial
+    board, and the other half backward from the goal (by undoing moves), and
+    joins the two up wherever they reach the same board. Since the number of
+    boards grows exponentially with the number of moves, this looks at far
+    fewer boards on long puzzles, and finds a solution with the fewest moves.
+  * astar: A* search. Looks at the boards that look closest to the goal first,
+    using an estimate of the moves left that is never too high (see
+    ``_estimate_moves``), and skips any board that can't possibly be finished
+    within max_turns. Finds a solution with the fewest moves.
+  * parallel: splits the first move or two into separate boards, and has
+    several processes take turns pulling those off a shared queue and
+    searching them depth-first. Everything stops as soon as one of them finds
+    a solution. Like dfs, that isn't necessarily the shortest one.
+  * por: breadth-first, but only trying one order of moves that don't share
+    a pillar. Moving stones between pillars 1 and 2 and then between 3 and 4
+    ends up the same as doing it the other way around, so only the order
+    with the lower move (by position in the config) first is searched, and
+    the other order never gets as far as being looked up in the boards
+    already seen. Finds a solution with the fewest moves.
+
+Pass the mode to ``solve()``, or on the command line:
+
+    python solve.py [search mode]
+
+## Watching a search:
+
+Pass ``on_event`` to ``solve()`` to be sent a SolverEvent every
+PROGRESS_INTERVAL boards searched, and once more when it finishes, with how
+many boards have been searched, how many were skipped as already seen, how
+many moves deep they were, and how fast it's going. Or on the command line:
+
+    python solve.py [search mode] --progress
+
+## Caching solutions:
+
+Pass a ``SolutionCache`` (from solution_cache.py, at the top of the repo) as
+``cache`` to ``solve()`` or ``solve_all()`` to save each solution, and look it
+up instead of searching if the same puzzle is solved again with the same
+search mode. From the command line, use ``--cache solutions.sqlite3``.
+
+## Solving lots of puzzles at once:
+
+``solve_all()`` solves a whole MultiplePuzzleConfig (or PuzzleCatalog, see
+puzzle_catalog.py) across several processes,
+giving up on any puzzle that takes longer than a timeout, and yields a
+PuzzleResult for each puzzle as it finishes. From the command line:
+
+    python solve.py [search mode] --workers 4 --timeout 60
+
+Add ``--catalog puzzles.jsonl`` to load the puzzles from a catalog file instead
+of puzzle_config.py, and ``--puzzles 22 47`` to only solve some of them.
 
-from typing import Dict, List, Optional, Set, Tuple, TypedDict
+"""
 
-from puzzle_config import PUZZLES
+import heapq
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from collections import deque
+from functools import reduce
+from math import ceil, gcd, inf
+from multiprocessing.connection import Connection, wait
+from queue import Empty
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Protocol,
+    Set,
+    Sized,
+    Tuple,
+    TypedDict,
+)
+
+from puzzle_types import (
+    BoardPositions,
+    MultiplePuzzleConfig,
+    Pillar,
+    PillarDistance,
+    PuzzleConfig,
+)
 
 
 ###############################################################################
 
 # TYPE DEFINITIONS
 
-# Iterable of tuples describing the layout of the current board. First number in
-# the tuple is the column number; second number is the number of stones sitting
-# on the column.
-Pillar = Tuple[int, int]
-BoardPositions = Tuple[Pillar]
-
-# Iterable of tuples describing distance to each of the pillars relative to another
-# pillar. First number of the tuple is the column number to move stones to;
-# second number is the distance (number of hops) stones must be moved to reach
-# that pillar. If the distance is 0, then the stones are either already at the
-# pillar, or the pillar is unreachable.
-PillarDistance = Tuple[Tuple[int, int]]
+# Pillar, BoardPositions, PillarDistance, PuzzleConfig and MultiplePuzzleConfig
+# are in puzzle_types.py
 
 # Tuple representing a move in the game. First number of the tuple is the
 # number of the pillar to move from; second is the number of the pillar to move
 # to
 GameMove = Tuple[int, int]
 
-class PuzzleConfig(TypedDict):
-    max_turns: int
-    initial: BoardPositions
-    goal: BoardPositions
-    config: Tuple[PillarDistance]
-
-# Dictionary of puzzle configurations. The key is the number of the puzzle
-MultiplePuzzleConfig = Dict[int, PuzzleConfig]
-
-AlreadySeenMoves = Set[int]
 BoardState = Tuple[BoardPositions, List[GameMove]]
-BoardQueue = Tuple[List[BoardState], AlreadySeenMoves]
+
+# Every legal move for a puzzle, worked out once before searching. Each move is
+# the index of the pillar to move stones from, the index of the pillar to move
+# them to, and how many stones get moved. Moves with a distance of 0 or less
+# are left out, since they can never be made.
+PillarMove = Tuple[int, int, int]
+MoveTable = List[PillarMove]
+
+# While searching, a board is just the number of stones on each pillar (in
+# the same order as the puzzle config), and the steps taken are indexes into
+# the MoveTable. Pillar numbers only get filled back in for the Solution.
+StoneCounts = Tuple[int, ...]
+MoveSteps = Tuple[int, ...]
+SearchState = Tuple[StoneCounts, MoveSteps]
+
+# The fewest moves each board has been reached in so far. A board is only
+# looked at again if it turns up in fewer moves. Boards are keyed by a single
+# number, with the stones on each pillar as one of its digits (see
+# _board_key in solve()), so that a move just adds the same amount to it.
+BoardKey = int
+BestDepths = Dict[BoardKey, int]
+
+# Boards that came close to the goal, kept for the debug output when a search
+# fails. It's a heap of (-stones off, -moves, board), so the worst of them is
+# always on top and is the one to drop once it's full.
+NearMisses = List[Tuple[int, int, SearchState]]
 
 class Solution(TypedDict):
     status: str  # solved, unsolved
     steps: List[GameMove]
     debug: Optional[List[List[GameMove]]]
 
+# Sent to solve()'s on_event callback. event is 'progress' while searching, or
+# 'finished' at the end (when status is the Solution's status). Boards that
+# are searched count towards nodes_expanded and depth_histogram (keyed by how
+# many moves it took to reach them); boards skipped because they had already
+# been reached in as few moves count towards duplicates_skipped.
+class SolverEvent(TypedDict):
+    event: str
+    search_mode: str
+    status: Optional[str]
+    elapsed: float
+    nodes_expanded: int
+    states_generated: int
+    duplicates_skipped: int
+    dedup_hit_rate: float
+    frontier_size: int
+    depth_histogram: Dict[int, int]
+    states_per_second: float
+
+# What solve_all() gives back for each puzzle. status is the Solution's status,
+# or 'timeout' if the puzzle ran out of time, or 'error' if solve() raised (in
+# which case error has the traceback). elapsed is in seconds.
+class PuzzleResult(TypedDict):
+    puzzle_number: int
+    status: str
+    solution: Optional[Solution]
+    elapsed: float
+    error: Optional[str]
+
+# How many near misses to keep for a failed search by default
+MAX_NEAR_MISSES = 10
+
+# How many boards to search between each 'progress' SolverEvent
+PROGRESS_INTERVAL = 100000
+
+# See solution_cache.py
+class Cache(Protocol):
+    def get(self, namespace: str, version: int, key: Any) -> Optional[Any]:
+        ...
+
+    def put(self, namespace: str, version: int, key: Any, value: Any):
+        ...
+
+CACHE_NAMESPACE = 'mystic_pillars'
+CACHE_VERSION = 2
+
+SEARCH_MODES = (
+    'dfs',
+    'bfs',
+    'iddfs',
+    'meet_in_middle',
+    'astar',
+    'parallel',
+    'por',
+)
+
+# How many boards the parallel search tries to give each worker to start with.
+# More boards means the workers all stay busy until close to the end, at the
+# cost of the same board sometimes being searched by two workers.
+TASKS_PER_WORKER = 8
+# How often (in seconds) the parallel search checks that its workers are still
+# running, while it waits for them
+WORKER_POLL_INTERVAL = 1
+
 ###############################################################################
 
 # SOLVER
 
-def solve(puzzle_config: PuzzleConfig) -> Solution:
+def solve(
+        puzzle_config: PuzzleConfig,
+        search_mode: str='dfs',
+        workers: Optional[int]=None,
+        max_near_misses: int=MAX_NEAR_MISSES,
+        on_event: Optional[Callable[[SolverEvent], None]]=None,
+        cache: Optional[Cache]=None,
+) -> Solution:
+    if search_mode not in SEARCH_MODES:
+        raise ValueError(f'Unknown search mode: {search_mode}')
+
+    # Only kept up to date if there's an on_event to report to
+    started: float = time.perf_counter()
+    stats: Dict[str, int] = {
+        'nodes_expanded': 0,
+        'states_generated': 0,
+        'duplicates_skipped': 0,
+    }
+    depth_histogram: Dict[int, int] = {}
+    # Whatever the search is keeping the boards it has yet to search in
+    current_frontier: List[Sized] = [()]
+
+    def _emit(event: str, status: Optional[str]=None):
+        elapsed = time.perf_counter() - started
+        seen = stats['states_generated'] + stats['duplicates_skipped']
+        on_event({
+            'event': event,
+            'search_mode': search_mode,
+            'status': status,
+            'elapsed': elapsed,
+            'nodes_expanded': stats['nodes_expanded'],
+            'states_generated': stats['states_generated'],
+            'duplicates_skipped': stats['duplicates_skipped'],
+            'dedup_hit_rate': stats['duplicates_skipped'] / seen if seen else 0.0,
+            'frontier_size': len(current_frontier[0]),
+            'depth_histogram': dict(depth_histogram),
+            'states_per_second': (
+                stats['nodes_expanded'] / elapsed if elapsed else 0.0
+            ),
+        })
+
+    def _record_expansion(depth: int, generated: int, duplicates: int):
+        stats['nodes_expanded'] += 1
+        stats['states_generated'] += generated
+        stats['duplicates_skipped'] += duplicates
+        depth_histogram[depth] = depth_histogram.get(depth, 0) + 1
+        if stats['nodes_expanded'] % PROGRESS_INTERVAL == 0:
+            _emit('progress')
+
+    if cache is not None:
+        cache_key = _cache_key(puzzle_config, search_mode, max_near_misses)
+        cached = cache.get(CACHE_NAMESPACE, CACHE_VERSION, cache_key)
+        if cached is not None:
+            solution = _solution_from_cache(cached)
+            if on_event:
+                _emit('finished', solution['status'])
+            return solution
+
     NO_SOLUTION = {
         'status': 'no_solution',
         'steps': [],
@@ -87,165 +305,211 @@ def solve(puzzle_config: PuzzleConfig) -> Solution:
         sum([1 for pillar in initial if pillar[1] > 0]) -
         sum([1 for pillar in goal if pillar[1] > 0])
     )
-    total_initial_value: int = sum(pillar[1] for pillar in initial)
-    total_goal_value: int = sum(pillar[1] for pillar in goal)
     IS_NOT_SOLVEABLE: bool = (
         min_turns > max_turns or
-        total_initial_value != total_goal_value
+        check_feasibility(puzzle_config) is not None
     )
 
     if IS_NOT_SOLVEABLE:
+        if on_event:
+            _emit('finished', NO_SOLUTION['status'])
         return NO_SOLUTION
 
+    labels: List[int] = [pillar[0] for pillar in initial]
+    initial_counts: StoneCounts = tuple(pillar[1] for pillar in initial)
+    goal_counts: StoneCounts = tuple(pillar[1] for pillar in goal)
+    moves: MoveTable = compile_moves(config)
+    indexed_moves: List[Tuple[int, PillarMove]] = list(enumerate(moves))
+
+    # No pillar can ever have more stones than this, so it works as the base
+    # for the digits of a BoardKey
+    key_base: int = max(sum(initial_counts), sum(goal_counts)) + 1
+    key_digits: List[int] = [key_base ** idx for idx in range(len(labels))]
+    # How much each move changes a BoardKey by
+    key_shifts: List[int] = [
+        distance * (key_digits[to_idx] - key_digits[from_idx])
+        for from_idx, to_idx, distance in moves
+    ]
+
     ########################### HELPER METHODS ################################
 
-    def _hash_state(position_list: BoardPositions) -> int:
-        return hash(position_list)
+    def _board_key(counts: StoneCounts) -> BoardKey:
+        return sum([
+            count * digit for count, digit in zip(counts, key_digits)
+        ])
 
     def _seed_queue(
-        current_state: BoardState,
-        solutions_already_seen: AlreadySeenMoves,
-    ) -> BoardQueue:
-
-        # Helper methods
-        def _find_new_state(
-                current_pillar_info: Tuple[int, Pillar],
-                target_pillar_info: Tuple[int, Pillar],
-                already_seen_in_run: AlreadySeenMoves,
-                already_seen_global: AlreadySeenMoves,
-                old_pillars: BoardPositions,
-                old_steps: List[GameMove],
-        ) -> Tuple[BoardState, int]:
-
-            current_pillar_idx, current_pillar = current_pillar_info
-            target_pillar_idx, target_pillar = target_pillar_info
-
-            value_offset: int = _get_pillar_offset(
-                current_pillar_idx,
-                target_pillar_idx,
-            )
-            if _is_illegal_move(current_pillar, value_offset):
-                empty_response: Tuple[BoardState, int] = ((None, []), 0)
-                return empty_response
-
-            new_pillars: BoardPositions = _get_new_pillars(
-                current_pillar,
-                current_pillar_idx,
-                target_pillar,
-                target_pillar_idx,
-                value_offset,
-                old_pillars,
-            )
-            new_steps: List[GameMove] = _get_new_steps(
-                current_pillar,
-                target_pillar,
-                old_steps,
-            )
-
-            new_state_hash: int = _hash_state(new_pillars + (len(new_steps),))
-            if (
-                new_state_hash in already_seen_in_run or
-                new_state_hash in already_seen_global
-            ):
-                invalid_response: Tuple[BoardState, int] = (
-                    (None, []),
-                    new_state_hash,
-                )
-                return invalid_response
-
-            valid_response: Tuple[BoardState, int] = (
-                (new_pillars, new_steps),
-                new_state_hash,
-            )
-            return valid_response
-
-        def _get_new_pillars(
-                from_pillar: Pillar,
-                from_idx: int,
-                to_pillar: Pillar,
-                to_idx: int,
-                value_offset: int,
-                old_pillars: BoardPositions,
-        ) -> BoardPositions:
-
-            new_pillars = list(old_pillars)
-
-            new_from = (from_pillar[0], from_pillar[1] - value_offset)
-            new_to = (to_pillar[0], to_pillar[1] + value_offset)
-            new_pillars[from_idx] = new_from
-            new_pillars[to_idx] = new_to
-
-            return tuple(new_pillars)
-
-        def _get_new_steps(
-                from_pillar: Pillar,
-                to_pillar: Pillar,
-                steps: List[GameMove],
-        ) -> List[GameMove]:
-            new_steps = steps[:]
-            new_steps.append((from_pillar[0], to_pillar[0]))
-            return new_steps
-
-        def _get_pillar_offset(
-                pillar1_index: int,
-                pillar2_index: int,
-        ) -> int:
-            return config[pillar1_index][pillar2_index][1]
-
-        def _is_illegal_move(
-                pillar: Pillar,
-                offset_from_pillar: int,
-        ) -> bool:
-            value_for_pillar = pillar[1]
-
-            return (
-                offset_from_pillar <= 0 or
-                offset_from_pillar > value_for_pillar
-            )
-
-        #################### BEGIN MAIN FUNCTION EXECUTION ####################
-
-        queue: List[BoardState] = []
-        pillars, steps = current_state
-        already_seen_in_run: AlreadySeenMoves = set()
-
-        for current_pillar in enumerate(pillars):
-            for target_pillar in enumerate(pillars):
-                new_state, seen_state = _find_new_state(
-                    current_pillar,
-                    target_pillar,
-                    already_seen_in_run,
-                    solutions_already_seen,
-                    pillars,
-                    steps,
-                )
-                if new_state[0] is not None:
-                    queue.append(new_state)
-                already_seen_in_run.add(seen_state)
-
-        next_queue: BoardQueue = (queue, already_seen_in_run)
-        return next_queue
-
-    def _is_close_to_goal(
-            current_position: BoardPositions,
-            goal: BoardPositions,
-            max_value_difference: int=2,
-    ) -> bool:
-        # NOTE: max_value_difference should always be a multiple of 2,
-        # because if a pillar has one too many stones, there should be
-        # a corresponding pillar that has one too few stones.
-        off_by = sum([
-            abs(current_position[idx][1] - goal[idx][1])
-            for idx in range(len(goal))
+        current_state: SearchState,
+        best_depths: BestDepths,
+        indexed_moves: Iterable[Tuple[int, PillarMove]],
+        direction: int=1,
+    ) -> List[SearchState]:
+        """
+        Every board that one of the moves (with their index) takes this one
+        to, that hasn't already been reached in as few moves.
+
+        With a direction of -1, the moves are undone instead: these are the
+        boards that can reach this one in a single move, and steps are the
+        moves left to get to the goal. Moving d stones from pillar A to
+        pillar B can be undone as long as B has at least d stones (A is then
+        certain to have had enough stones to make the move).
+        """
+        queue: List[SearchState] = []
+        counts, steps = current_state
+        depth: int = len(steps) + 1
+        duplicates = 0
+        # Each move is made (and then taken back) on this one list, and is
+        # only copied into a StoneCounts if the board turns out to be new
+        board: List[int] = list(counts)
+        key: BoardKey = _board_key(counts)
+
+        for move_idx, (from_idx, to_idx, distance) in indexed_moves:
+            shift = distance * direction
+            if board[from_idx] < shift or board[to_idx] < -shift:
+                continue
+
+            new_key = key + key_shifts[move_idx] * direction
+            if best_depths.get(new_key, depth + 1) <= depth:
+                duplicates += 1
+                continue
+            best_depths[new_key] = depth
+
+            board[from_idx] -= shift
+            board[to_idx] += shift
+            new_position: StoneCounts = tuple(board)
+            board[from_idx] += shift
+            board[to_idx] -= shift
+            if direction > 0:
+                queue.append((new_position, steps + (move_idx,)))
+            else:
+                queue.append((new_position, (move_idx,) + steps))
+
+        if on_event:
+            _record_expansion(depth - 1, len(queue), duplicates)
+        return queue
+
+    def _canonical_moves() -> List[List[Tuple[int, PillarMove]]]:
+        """
+        For the por search mode: the moves (with their index) that can come
+        straight after each move. Two moves that don't share a pillar have the
+        same result in either order, so the one with the lower index has to
+        come first. The extra list at the end is for before any moves are made.
+
+        Skipping boards that have already been seen is still safe, as long as
+        the search is breadth-first: then each board is first reached by its
+        (move by move) lowest path of the fewest moves, and swapping two
+        moves that don't share a pillar into order would make a lower path,
+        so that path only ever makes allowed moves.
+        """
+        pillars = [{from_idx, to_idx} for from_idx, to_idx, _ in moves]
+        follow_moves = [
+            [
+                (move_idx, move)
+                for move_idx, move in enumerate(moves)
+                if move_idx > last_idx or pillars[move_idx] & pillars[last_idx]
+            ]
+            for last_idx in range(len(moves))
+        ]
+        follow_moves.append(list(enumerate(moves)))
+        return follow_moves
+
+    def _stones_off(
+            current_position: StoneCounts,
+            goal: StoneCounts,
+    ) -> int:
+        return sum([
+            abs(current_value - goal_value)
+            for current_value, goal_value in zip(current_position, goal)
         ])
-        return off_by <= max_value_difference
+
+    def _add_near_miss(
+            near_misses: NearMisses,
+            state: SearchState,
+            goal: StoneCounts,
+    ):
+        """
+        Keeps the board if it's close to the goal, and one of the
+        max_near_misses closest seen so far (fewest stones off, then fewest
+        moves)
+        """
+        if not max_near_misses:
+            return
+        position, steps = state
+        off_by = _stones_off(position, goal)
+        # NOTE: this should always be a multiple of 2, because if a pillar
+        # has one too many stones, there should be a corresponding pillar
+        # that has one too few stones.
+        if off_by > 2:
+            return
+
+        entry = (-off_by, -len(steps), state)
+        if len(near_misses) < max_near_misses:
+            heapq.heappush(near_misses, entry)
+        elif entry > near_misses[0]:
+            heapq.heapreplace(near_misses, entry)
 
     def _is_solved(
-            current_position: BoardPositions,
-            goal_position: BoardPositions,
+            current_position: StoneCounts,
+            goal_position: StoneCounts,
     ) -> bool:
         return current_position == goal_position
 
+    # The most stones that can be moved at once
+    max_distance: int = max(
+        [distance for _, _, distance in moves],
+        default=0,
+    )
+
+    def _estimate_moves(
+            current_position: StoneCounts,
+            goal: StoneCounts,
+    ) -> float:
+        """
+        A lower bound on the moves left. A move takes stones off of one pillar
+        and puts them on one other pillar, so:
+
+          * each move can only fix one pillar with too many stones, and one
+            pillar with too few (so it's at least half of the pillars that
+            are off, and usually more)
+          * each move shifts no more than max_distance stones
+        """
+        too_many = 0
+        too_few = 0
+        extra_stones = 0
+        for current_value, goal_value in zip(current_position, goal):
+            if current_value > goal_value:
+                too_many += 1
+                extra_stones += current_value - goal_value
+            elif current_value < goal_value:
+                too_few += 1
+
+        if not extra_stones:
+            return 0
+        if not max_distance:
+            return inf
+        return max(too_many, too_few, ceil(extra_stones / max_distance))
+
+    def _to_board_state(state: SearchState) -> BoardState:
+        """
+        Puts the pillar numbers back into a board and its steps
+        """
+        counts, steps = state
+        position: BoardPositions = tuple(zip(labels, counts))
+        game_moves: List[GameMove] = [
+            (labels[moves[move_idx][0]], labels[moves[move_idx][1]])
+            for move_idx in steps
+        ]
+        return (position, game_moves)
+
+    def _to_solution(steps: MoveSteps) -> Solution:
+        _, game_moves = _to_board_state((goal_counts, steps))
+        solution: Solution = {
+            'status': 'solved',
+            'steps': game_moves,
+            'debug': [],
+        }
+        return solution
+
     # This is a ridiculously ugly function. It's got a runtime of approximately:
     #
     #    O(n) = E(i->k) (n^2)^i
@@ -256,52 +520,786 @@ def solve(puzzle_config: PuzzleConfig) -> Solution:
     # We don't have to explore all of these, so we speed up the function by
     # tracking what we've already seen and trying to parallelize some of the
     # operations
+    #
+    # Taking boards off the end of the queue makes this depth-first; taking
+    # them off the front (breadth_first) means every board with n moves is
+    # looked at before any board with n + 1, so the first solution found is
+    # the shortest. canonical is for the por search mode (which has to be
+    # breadth-first).
     def main(
-            queue: List[BoardState],
-            goal: BoardPositions,
-    ) -> Tuple[Optional[Solution], Optional[List[BoardState]]]:
-        solutions_already_seen: AlreadySeenMoves = set()
+            queue: List[SearchState],
+            goal: StoneCounts,
+            turn_limit: int=max_turns,
+            breadth_first: bool=False,
+            canonical: bool=False,
+    ) -> Tuple[Optional[Solution], Optional[NearMisses]]:
+        if canonical:
+            follow_moves = _canonical_moves()
+            def _seed(state, best_depths):
+                _, steps = state
+                last_move = steps[-1] if steps else -1
+                return _seed_queue(state, best_depths, follow_moves[last_move])
+        else:
+            def _seed(state, best_depths):
+                return _seed_queue(state, best_depths, indexed_moves)
+
+        best_depths: BestDepths = {
+            _board_key(position): len(steps) for position, steps in queue
+        }
+        board_queue: Deque[SearchState] = deque(queue)
+        current_frontier[0] = board_queue
+
+        debugging_queue: NearMisses = []
+        while board_queue:
+            if breadth_first:
+                current_position, steps = board_queue.popleft()
+            else:
+                current_position, steps = board_queue.pop()
 
-        debugging_queue: List[BoardState] = []
-        while queue:
-            current_position, steps = queue.pop()
+            if best_depths[_board_key(current_position)] < len(steps):
+                # This board was reached in fewer moves after it was queued
+                continue
 
             if _is_solved(current_position, goal):
-                solution: Solution = {
-                    'status': 'solved',
-                    'steps': steps,
-                    'debug': [],
-                }
-                return (solution, [])
-
-            if _is_close_to_goal(current_position, goal):
-                close_state: BoardState = (current_position, steps)
-                debugging_queue.append(close_state)
-
-            if len(steps) >= max_turns:
+                return (_to_solution(steps), [])
+
+            _add_near_miss(debugging_queue, (current_position, steps), goal)
+
+            if len(steps) >= turn_limit:
                     continue
             else:
-                new_states, seen_states = _seed_queue(
+                new_states = _seed(
                     (current_position, steps),
-                    solutions_already_seen,
+                    best_depths,
+                )
+                board_queue.extend(new_states)
+
+        return (None, debugging_queue)
+
+    def main_meet_in_middle(
+            initial: StoneCounts,
+            goal: StoneCounts,
+    ) -> Tuple[Optional[Solution], Optional[NearMisses]]:
+        """
+        Breadth-first from both ends, one level at a time, keeping the steps
+        to every board seen. Afterwards, any board seen from both ends is a
+        solution; the shortest one wins.
+
+        If there isn't one, the near misses are found the same way: by going
+        backward from every board that's one stone off of the goal instead,
+        and joining those up with the boards seen going forward.
+        """
+        def _expand(
+                starts: List[StoneCounts],
+                turns: int,
+                direction: int,
+        ) -> Dict[StoneCounts, MoveSteps]:
+            best_depths: BestDepths = {_board_key(start): 0 for start in starts}
+            seen: Dict[StoneCounts, MoveSteps] = {start: () for start in starts}
+            frontier: List[SearchState] = [(start, ()) for start in starts]
+            for _ in range(turns):
+                current_frontier[0] = frontier
+                next_frontier: List[SearchState] = []
+                for state in frontier:
+                    next_frontier.extend(_seed_queue(
+                        state,
+                        best_depths,
+                        indexed_moves,
+                        direction,
+                    ))
+                seen.update(next_frontier)
+                frontier = next_frontier
+            return seen
+
+        forward_turns = (max_turns + 1) // 2
+        backward_turns = max_turns - forward_turns
+        forward = _expand([initial], forward_turns, 1)
+        backward = _expand([goal], backward_turns, -1)
+
+        best_steps: Optional[MoveSteps] = None
+        for position, steps_from_start in forward.items():
+            steps_to_goal = backward.get(position)
+            if steps_to_goal is None:
+                continue
+            steps = steps_from_start + steps_to_goal
+            if best_steps is None or len(steps) < len(best_steps):
+                best_steps = steps
+
+        if best_steps is not None:
+            return (_to_solution(best_steps), [])
+
+        near_goals: List[StoneCounts] = []
+        for from_idx, from_count in enumerate(goal):
+            if not from_count:
+                continue
+            for to_idx in range(len(goal)):
+                if to_idx != from_idx:
+                    near_goal = list(goal)
+                    near_goal[from_idx] -= 1
+                    near_goal[to_idx] += 1
+                    near_goals.append(tuple(near_goal))
+        backward = _expand(near_goals, backward_turns, -1)
+
+        debugging_queue: NearMisses = []
+        for position, steps_from_start in forward.items():
+            steps_to_near_goal = backward.get(position)
+            if steps_to_near_goal is None:
+                continue
+            near_goal = list(position)
+            for move_idx in steps_to_near_goal:
+                from_idx, to_idx, distance = moves[move_idx]
+                near_goal[from_idx] -= distance
+                near_goal[to_idx] += distance
+            _add_near_miss(
+                debugging_queue,
+                (tuple(near_goal), steps_from_start + steps_to_near_goal),
+                goal,
+            )
+        return (None, debugging_queue)
+
+    def main_astar(
+            initial: StoneCounts,
+            goal: StoneCounts,
+    ) -> Tuple[Optional[Solution], Optional[NearMisses]]:
+        best_depths: BestDepths = {_board_key(initial): 0}
+        # Ties go to the board with the most moves so far (it's probably
+        # closer to the goal), and then to whichever was queued first
+        heap = [(_estimate_moves(initial, goal), 0, 0, initial, ())]
+        current_frontier[0] = heap
+        queued = 1
+
+        debugging_queue: NearMisses = []
+        while heap:
+            _, _, _, current_position, steps = heapq.heappop(heap)
+            if best_depths[_board_key(current_position)] < len(steps):
+                # This board was reached in fewer moves after it was queued
+                continue
+
+            if _is_solved(current_position, goal):
+                return (_to_solution(steps), [])
+
+            _add_near_miss(debugging_queue, (current_position, steps), goal)
+
+            new_states = _seed_queue(
+                (current_position, steps),
+                best_depths,
+                indexed_moves,
+            )
+            for new_position, new_steps in new_states:
+                estimate = len(new_steps) + _estimate_moves(new_position, goal)
+                if estimate > max_turns:
+                    # Still worth reporting if the search fails
+                    _add_near_miss(
+                        debugging_queue,
+                        (new_position, new_steps),
+                        goal,
+                    )
+                    continue
+                heapq.heappush(
+                    heap,
+                    (estimate, -len(new_steps), queued, new_position,
+                     new_steps),
                 )
-                solutions_already_seen.update(seen_states)
-                queue.extend(new_states)
+                queued += 1
+
+        return (None, debugging_queue)
 
+    def main_parallel(
+            initial: StoneCounts,
+            goal: StoneCounts,
+    ) -> Tuple[Optional[Solution], Optional[NearMisses]]:
+        """
+        Splits the search up into the boards after the first move (or two, if
+        that isn't enough to keep every worker busy), and hands those off to
+        _search_in_parallel() as smaller puzzles of their own. If none of them
+        are solved, the near misses are picked from the ones the workers found
+        and the boards seen while splitting the search up.
+        """
+        if _is_solved(initial, goal):
+            return (_to_solution(()), [])
+
+        worker_count = workers or multiprocessing.cpu_count()
+        best_depths: BestDepths = {_board_key(initial): 0}
+        tasks: List[SearchState] = [(initial, ())]
+        split_boards: List[SearchState] = [(initial, ())]
+        for _ in range(2):
+            if len(tasks) >= worker_count * TASKS_PER_WORKER:
+                break
+            current_frontier[0] = tasks
+            next_tasks: List[SearchState] = []
+            for state in tasks:
+                if len(state[1]) < max_turns:
+                    next_tasks.extend(
+                        _seed_queue(state, best_depths, indexed_moves),
+                    )
+            tasks = next_tasks
+            split_boards.extend(tasks)
+
+            for position, steps in tasks:
+                if _is_solved(position, goal):
+                    return (_to_solution(steps), [])
+
+        steps, worker_near_misses = _search_in_parallel(
+            puzzle_config,
+            [_to_board_state(state) for state in tasks],
+            worker_count,
+            max_near_misses,
+        )
+        if steps is not None:
+            solution: Solution = {
+                'status': 'solved',
+                'steps': steps,
+                'debug': [],
+            }
+            return (solution, [])
+
+        # The workers' near misses come back with pillar numbers, so they're
+        # turned back into SearchStates. The boards each worker started from
+        # are usually among them too.
+        move_indexes: Dict[GameMove, int] = {
+            (labels[from_idx], labels[to_idx]): move_idx
+            for move_idx, (from_idx, to_idx, _) in indexed_moves
+        }
+        near_misses: Set[SearchState] = set(split_boards)
+        for position, game_moves in worker_near_misses:
+            near_misses.add((
+                tuple(count for _, count in position),
+                tuple(move_indexes[game_move] for game_move in game_moves),
+            ))
+
+        debugging_queue: NearMisses = []
+        for state in near_misses:
+            _add_near_miss(debugging_queue, state, goal)
         return (None, debugging_queue)
 
     # Begin main function execution
 
-    queue: List[BoardState] = [(initial, [])]
-    solution, debugging_queue = main(queue, goal)
+    queue: List[SearchState] = [(initial_counts, ())]
+    if search_mode == 'bfs':
+        solution, debugging_queue = main(queue, goal_counts, breadth_first=True)
+    elif search_mode == 'astar':
+        solution, debugging_queue = main_astar(initial_counts, goal_counts)
+    elif search_mode == 'meet_in_middle':
+        solution, debugging_queue = main_meet_in_middle(
+            initial_counts,
+            goal_counts,
+        )
+    elif search_mode == 'parallel':
+        solution, debugging_queue = main_parallel(initial_counts, goal_counts)
+    elif search_mode == 'por':
+        solution, debugging_queue = main(
+            queue,
+            goal_counts,
+            breadth_first=True,
+            canonical=True,
+        )
+    elif search_mode == 'iddfs':
+        for turn_limit in range(min_turns, max_turns + 1):
+            solution, debugging_queue = main(queue, goal_counts, turn_limit)
+            if solution:
+                break
+    else:
+        solution, debugging_queue = main(queue, goal_counts)
 
     if not solution:
         solution = FAILURE_SOLUTION.copy()
-        solution['debug'] = debugging_queue
+        # Closest first
+        solution['debug'] = [
+            _to_board_state(state)
+            for _, _, state in sorted(debugging_queue, reverse=True)
+        ]
+
+    if on_event:
+        _emit('finished', solution['status'])
+    if cache is not None:
+        cache.put(CACHE_NAMESPACE, CACHE_VERSION, cache_key, solution)
+    return solution
 
+
+def _cache_key(
+        puzzle_config: PuzzleConfig,
+        search_mode: str,
+        max_near_misses: int,
+) -> Dict[str, Any]:
+    return {
+        'max_turns': puzzle_config['max_turns'],
+        'initial': puzzle_config['initial'],
+        'goal': puzzle_config['goal'],
+        'config': puzzle_config['config'],
+        'search_mode': search_mode,
+        'max_near_misses': max_near_misses,
+    }
+
+
+def _solution_from_cache(cached: Dict[str, Any]) -> Solution:
+    """
+    Turns the lists that a Solution comes back from the cache with into
+    tuples again
+    """
+    solution: Solution = {
+        'status': cached['status'],
+        'steps': [tuple(step) for step in cached['steps']],
+        'debug': [
+            (
+                tuple(tuple(pillar) for pillar in position),
+                [tuple(step) for step in steps],
+            )
+            for position, steps in cached['debug']
+        ],
+    }
     return solution
 
 
+def compile_moves(config: Tuple[PillarDistance]) -> MoveTable:
+    """
+    Every (from, to) pair of pillars in the config that stones can actually
+    be moved between, and how many stones that moves
+    """
+    return [
+        (from_idx, to_idx, distance)
+        for from_idx, row in enumerate(config)
+            for to_idx, (_, distance) in enumerate(row)
+                if distance > 0
+    ]
+
+
+def _search_in_parallel(
+        puzzle_config: PuzzleConfig,
+        tasks: List[BoardState],
+        workers: int,
+        max_near_misses: int,
+) -> Tuple[Optional[List[GameMove]], List[BoardState]]:
+    """
+    Searches from each of the given boards (with the moves it took to get
+    there) across `workers` processes. Whichever worker is free takes the next
+    board off a shared queue, so a worker that gets a few quick boards ends up
+    picking up more of the rest. Once any worker finds a solution, all of them
+    are stopped and the full list of steps is returned. Otherwise, each
+    worker's closest near misses are returned (up to max_near_misses from
+    each), for the caller to pick the closest of.
+    """
+    if multiprocessing.current_process().daemon:
+        # Already running inside solve_all(), which can't start processes
+        # of its own, so just go through the boards here instead
+        near_misses: List[BoardState] = []
+        for task in tasks:
+            steps, task_near_misses = _solve_task(
+                puzzle_config,
+                task,
+                max_near_misses,
+            )
+            if steps is not None:
+                return (steps, [])
+            near_misses = _closest_boards(
+                puzzle_config,
+                near_misses + task_near_misses,
+                max_near_misses,
+            )
+        return (None, near_misses)
+
+    task_queue = multiprocessing.Queue()
+    for task in tasks:
+        task_queue.put(task)
+    for _ in range(workers):
+        task_queue.put(None)
+    result_queue = multiprocessing.Queue()
+    cancelled = multiprocessing.Event()
+
+    processes = [
+        multiprocessing.Process(
+            target=_parallel_worker,
+            args=(puzzle_config, max_near_misses, task_queue, result_queue,
+                  cancelled),
+            daemon=True,
+        )
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    steps: Optional[List[GameMove]] = None
+    near_misses: List[BoardState] = []
+    try:
+        # Each worker sends ('solved', steps) when it finds a solution,
+        # ('done', near misses) once it runs out of boards to search, or
+        # ('error', traceback) if the search raised
+        reported = 0
+        while reported < workers and steps is None:
+            try:
+                outcome, payload = result_queue.get(
+                    timeout=WORKER_POLL_INTERVAL,
+                )
+            except Empty:
+                if any(process.is_alive() for process in processes):
+                    continue
+                try:
+                    outcome, payload = result_queue.get_nowait()
+                except Empty:
+                    raise RuntimeError(
+                        'A parallel search worker exited without a result',
+                    ) from None
+
+            reported += 1
+            if outcome == 'error':
+                raise RuntimeError(f'A parallel search worker failed:\n{payload}')
+            if outcome == 'solved':
+                steps = payload
+            elif outcome == 'done':
+                near_misses.extend(payload)
+    finally:
+        cancelled.set()
+        for process in processes:
+            if process.is_alive():
+                process.kill()
+            process.join()
+        task_queue.close()
+        result_queue.close()
+
+    if steps is not None:
+        return (steps, [])
+    return (None, near_misses)
+
+
+def _parallel_worker(
+        puzzle_config: PuzzleConfig,
+        max_near_misses: int,
+        task_queue: multiprocessing.Queue,
+        result_queue: multiprocessing.Queue,
+        cancelled: multiprocessing.Event,
+):
+    near_misses: List[BoardState] = []
+    result = ('done', near_misses)
+    try:
+        while not cancelled.is_set():
+            task = task_queue.get()
+            if task is None:
+                break
+            steps, task_near_misses = _solve_task(
+                puzzle_config,
+                task,
+                max_near_misses,
+            )
+            if steps is not None:
+                result = ('solved', steps)
+                break
+            # Only the closest are sent back, however many boards this
+            # worker searches
+            near_misses[:] = _closest_boards(
+                puzzle_config,
+                near_misses + task_near_misses,
+                max_near_misses,
+            )
+    except BaseException:
+        result = ('error', traceback.format_exc())
+    finally:
+        result_queue.put(result)
+
+
+def _solve_task(
+        puzzle_config: PuzzleConfig,
+        task: BoardState,
+        max_near_misses: int,
+) -> Tuple[Optional[List[GameMove]], List[BoardState]]:
+    """
+    Searches depth-first from a board part-way through the puzzle, with
+    however many turns are left. Returns all of the steps from the start of
+    the puzzle if that finds a solution, or else the near misses it found
+    (also with all of the steps from the start).
+    """
+    position, steps_so_far = task
+    remaining_puzzle: PuzzleConfig = {
+        **puzzle_config,
+        'initial': position,
+        'max_turns': puzzle_config['max_turns'] - len(steps_so_far),
+    }
+    solution = solve(remaining_puzzle, 'dfs', max_near_misses=max_near_misses)
+    if solution['status'] == 'solved':
+        return (steps_so_far + solution['steps'], [])
+    near_misses: List[BoardState] = [
+        (near_position, steps_so_far + steps)
+        for near_position, steps in solution['debug']
+    ]
+    return (None, near_misses)
+
+
+def _closest_boards(
+        puzzle_config: PuzzleConfig,
+        boards: List[BoardState],
+        limit: int,
+) -> List[BoardState]:
+    """
+    The `limit` boards with the fewest stones off of the goal, and then the
+    fewest moves
+    """
+    goal = dict(puzzle_config['goal'])
+
+    def _closeness(board: BoardState) -> Tuple[int, int]:
+        position, steps = board
+        stones_off = sum([
+            abs(count - goal[pillar]) for pillar, count in position
+        ])
+        return (stones_off, len(steps))
+
+    return heapq.nsmallest(limit, boards, key=_closeness)
+
+
+def solve_all(
+        puzzles: Mapping[int, PuzzleConfig],
+        search_mode: str='dfs',
+        workers: Optional[int]=None,
+        timeout: Optional[float]=None,
+        cache: Optional[Cache]=None,
+) -> Iterator[PuzzleResult]:
+    """
+    Solves every puzzle, each in its own process, with at most `workers`
+    running at once (the number of CPUs by default). A puzzle still running
+    after `timeout` seconds is stopped. Results are yielded in the order the
+    puzzles finish, not the order they were given in.
+
+    The cache is only used from this process: puzzles found in it are yielded
+    straight away, and the workers' solutions are saved to it as they finish.
+    """
+    if search_mode not in SEARCH_MODES:
+        raise ValueError(f'Unknown search mode: {search_mode}')
+    workers = workers or multiprocessing.cpu_count()
+
+    waiting = list(puzzles.items())
+    waiting.reverse()
+    # Keyed by the parent's end of each worker's pipe
+    running: Dict[
+        Connection,
+        Tuple[int, multiprocessing.Process, float, Dict[str, Any]],
+    ] = {}
+
+    def _result(
+            puzzle_number: int,
+            status: str,
+            started: float,
+            solution: Optional[Solution]=None,
+            error: Optional[str]=None,
+    ) -> PuzzleResult:
+        return {
+            'puzzle_number': puzzle_number,
+            'status': status,
+            'solution': solution,
+            'elapsed': time.perf_counter() - started,
+            'error': error,
+        }
+
+    def _stop(connection: Connection):
+        _, process, _, _ = running.pop(connection)
+        if process.is_alive():
+            process.kill()
+        process.join()
+        connection.close()
+
+    try:
+        while waiting or running:
+            while waiting and len(running) < workers:
+                puzzle_number, puzzle_config = waiting.pop()
+                cache_key = _cache_key(
+                    puzzle_config,
+                    search_mode,
+                    MAX_NEAR_MISSES,
+                )
+                if cache is not None:
+                    started = time.perf_counter()
+                    cached = cache.get(CACHE_NAMESPACE, CACHE_VERSION, cache_key)
+                    if cached is not None:
+                        yield _result(
+                            puzzle_number,
+                            cached['status'],
+                            started,
+                            solution=_solution_from_cache(cached),
+                        )
+                        continue
+                connection, child_connection = multiprocessing.Pipe(False)
+                process = multiprocessing.Process(
+                    target=_solve_worker,
+                    args=(child_connection, puzzle_config, search_mode),
+                    daemon=True,
+                )
+                process.start()
+                child_connection.close()
+                running[connection] = (
+                    puzzle_number,
+                    process,
+                    time.perf_counter(),
+                    cache_key,
+                )
+
+            if not running:
+                # Everything left was in the cache
+                continue
+
+            wait_for = None
+            if timeout is not None:
+                first_deadline = min(
+                    started + timeout for _, _, started, _ in running.values()
+                )
+                wait_for = max(0, first_deadline - time.perf_counter())
+
+            for connection in wait(list(running), wait_for):
+                puzzle_number, _, started, cache_key = running[connection]
+                try:
+                    outcome, payload = connection.recv()
+                except EOFError:
+                    outcome, payload = 'error', 'Worker exited without a result'
+
+                if outcome == 'solved':
+                    if cache is not None:
+                        cache.put(
+                            CACHE_NAMESPACE,
+                            CACHE_VERSION,
+                            cache_key,
+                            payload,
+                        )
+                    result = _result(
+                        puzzle_number,
+                        payload['status'],
+                        started,
+                        solution=payload,
+                    )
+                else:
+                    result = _result(
+                        puzzle_number,
+                        'error',
+                        started,
+                        error=payload,
+                    )
+                _stop(connection)
+                yield result
+
+            if timeout is not None:
+                now = time.perf_counter()
+                for connection, (puzzle_number, _, started, _) in list(
+                        running.items()):
+                    if now - started >= timeout:
+                        result = _result(puzzle_number, 'timeout', started)
+                        _stop(connection)
+                        yield result
+    finally:
+        for connection in list(running):
+            _stop(connection)
+
+
+def _solve_worker(
+        connection: Connection,
+        puzzle_config: PuzzleConfig,
+        search_mode: str,
+):
+    """
+    Runs in a worker process for solve_all(). Sends back ('solved', Solution),
+    or ('error', traceback) if solve() raised.
+    """
+    try:
+        connection.send(('solved', solve(puzzle_config, search_mode)))
+    except Exception:
+        connection.send(('error', traceback.format_exc()))
+    finally:
+        connection.close()
+
+
+def check_feasibility(puzzle_config: PuzzleConfig) -> Optional[str]:
+    """
+    Quick checks for puzzles that can't be solved however the stones are
+    moved, so they don't have to be searched. Returns why the puzzle can't be
+    solved, or None if it might be (only searching will tell).
+
+      * the initial board and the goal need the same number of stones
+      * a pillar's stone count only ever changes by the distances of the
+        moves to and from it, so it can only get to the goal if the change
+        is a multiple of those distances' greatest common divisor
+      * stones can't leave the pillars reachable from a pillar (there's no
+        move out of them), so those can't end up with fewer stones between
+        them; likewise the pillars that lead to a pillar can't end up with
+        more
+      * a move changes one pillar by at most the largest distance it has, and
+        each move changes two pillars, which gives a lower bound on how many
+        moves it takes (along with the one ``_estimate_moves`` uses in solve)
+    """
+    max_turns: int = puzzle_config['max_turns']
+    initial: BoardPositions = puzzle_config['initial']
+    goal: BoardPositions = puzzle_config['goal']
+
+    labels: List[int] = [pillar[0] for pillar in initial]
+    changes: List[int] = [
+        goal_pillar[1] - initial_pillar[1]
+        for initial_pillar, goal_pillar in zip(initial, goal)
+    ]
+    if sum(changes):
+        return (
+            f'the initial board has {sum(pillar[1] for pillar in initial)} '
+            f'stones, but the goal has {sum(pillar[1] for pillar in goal)}'
+        )
+
+    moves: MoveTable = compile_moves(puzzle_config['config'])
+    pillar_count = len(labels)
+    move_targets: List[List[int]] = [[] for _ in range(pillar_count)]
+    move_sources: List[List[int]] = [[] for _ in range(pillar_count)]
+    move_distances: List[List[int]] = [[] for _ in range(pillar_count)]
+    for from_idx, to_idx, distance in moves:
+        move_targets[from_idx].append(to_idx)
+        move_sources[to_idx].append(from_idx)
+        move_distances[from_idx].append(distance)
+        move_distances[to_idx].append(distance)
+
+    def _reachable(start: int, edges: List[List[int]]) -> Set[int]:
+        reached: Set[int] = {start}
+        stack: List[int] = [start]
+        while stack:
+            for next_idx in edges[stack.pop()]:
+                if next_idx not in reached:
+                    reached.add(next_idx)
+                    stack.append(next_idx)
+        return reached
+
+    # Fewest moves that have to start or end at each pillar
+    pillar_moves: List[int] = []
+    for idx, label in enumerate(labels):
+        change = changes[idx]
+        if not change:
+            pillar_moves.append(0)
+            continue
+        if not move_distances[idx]:
+            return f'stones can never be moved to or from pillar {label}'
+
+        step = reduce(gcd, move_distances[idx])
+        if change % step:
+            return (
+                f'pillar {label} can only gain or lose multiples of {step} '
+                f'stones, but needs to change by {change}'
+            )
+        if sum(changes[other] for other in _reachable(idx, move_targets)) < 0:
+            return (
+                f'pillar {label} and the pillars it leads to need to lose '
+                f'stones, but stones can never be moved out of them'
+            )
+        if sum(changes[other] for other in _reachable(idx, move_sources)) > 0:
+            return (
+                f'pillar {label} and the pillars that lead to it need to gain '
+                f'stones, but stones can never be moved into them'
+            )
+        pillar_moves.append(ceil(abs(change) / max(move_distances[idx])))
+
+    max_distance = max([distance for _, _, distance in moves], default=0)
+    extra_stones = sum(change for change in changes if change > 0)
+    fewest_moves = max(
+        sum(1 for change in changes if change < 0),
+        sum(1 for change in changes if change > 0),
+        ceil(extra_stones / max_distance) if max_distance else 0,
+        max(pillar_moves, default=0),
+        ceil(sum(pillar_moves) / 2),
+    )
+    if fewest_moves > max_turns:
+        return (
+            f'it takes at least {fewest_moves} moves, but there are only '
+            f'{max_turns}'
+        )
+
+    return None
+
+
 def pretty_print(solution: Solution, puzzle_number: int):
     DIVIDER = '--------'
 
@@ -339,11 +1337,110 @@ def pretty_print(solution: Solution, puzzle_number: int):
 ###############################################################################
 
 if __name__ == '__main__':
+    import argparse
     from timeit import timeit
 
+    parser = argparse.ArgumentParser(description='Solve Mystic Pillars puzzles')
+    parser.add_argument(
+        'search_mode',
+        nargs='?',
+        default='dfs',
+        choices=SEARCH_MODES,
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        help='solve puzzles in parallel across this many processes',
+    )
+    parser.add_argument(
+        '--progress',
+        action='store_true',
+        help='report search progress on stderr (not with --workers)',
+    )
+    parser.add_argument(
+        '--timeout',
+        type=float,
+        help='seconds to allow each puzzle (implies --workers)',
+    )
+    parser.add_argument(
+        '--cache',
+        metavar='PATH',
+        help='save solutions to (and look them up in) this SQLite file',
+    )
+    parser.add_argument(
+        '--catalog',
+        help='load the puzzles from this catalog file, not puzzle_config.py',
+    )
+    parser.add_argument(
+        '--puzzles',
+        nargs='+',
+        type=int,
+        metavar='NUMBER',
+        help='only solve these puzzles',
+    )
+    args = parser.parse_args()
+
+    if args.catalog:
+        from puzzle_catalog import PuzzleCatalog
+        PUZZLES = PuzzleCatalog(args.catalog)
+    else:
+        from puzzle_config import PUZZLES
+    if args.puzzles:
+        PUZZLES = {
+            puzzle_number: PUZZLES[puzzle_number]
+            for puzzle_number in args.puzzles
+        }
+
+    cache = None
+    if args.cache:
+        # solution_cache.py is shared with the other solvers, so it's up a
+        # level from here
+        sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        from solution_cache import SolutionCache
+        cache = SolutionCache(args.cache)
+
     def runme():
         for puzzle_number, config in PUZZLES.items():
-            solution = solve(config)
+            def _report(event: SolverEvent):
+                print(
+                    f'#{puzzle_number} {event["event"]}: '
+                    f'{event["nodes_expanded"]} searched, '
+                    f'{event["frontier_size"]} queued, '
+                    f'{event["dedup_hit_rate"]:.0%} already seen, '
+                    f'{event["states_per_second"]:.0f}/s, '
+                    f'by depth {event["depth_histogram"]}',
+                    file=sys.stderr,
+                )
+
+            solution = solve(
+                config,
+                args.search_mode,
+                on_event=_report if args.progress else None,
+                cache=cache,
+            )
             pretty_print(solution, puzzle_number)
 
-    print(timeit(runme, number=1))
+    def runme_parallel():
+        counts: Dict[str, int] = {}
+        results = solve_all(
+            PUZZLES,
+            args.search_mode,
+            workers=args.workers,
+            timeout=args.timeout,
+            cache=cache,
+        )
+        for result in results:
+            puzzle_number = result['puzzle_number']
+            counts[result['status']] = counts.get(result['status'], 0) + 1
+            if result['solution']:
+                pretty_print(result['solution'], puzzle_number)
+            elif result['status'] == 'timeout':
+                print(f'Puzzle #{puzzle_number} timed out after {result["elapsed"]:.1f}s')
+            else:
+                print(f'Puzzle #{puzzle_number} raised an error:\n{result["error"]}')
+        print(', '.join(f'{count} {status}' for status, count in counts.items()))
+
+    if args.workers or args.timeout is not None:
+        print(timeit(runme_parallel, number=1))
+    else:
+        print(timeit(runme, number=1))
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+# REQUIRES PYTHON >= 3.8
+
+"""
+A solution cache for the puzzle solvers, saved to a single SQLite file, so
+that solving the same puzzle again (in a later run, or from another process)
+is just a lookup.
+
+    cache = SolutionCache('solutions.sqlite3')
+
+    # mystic_pillars/solve.py
+    solve(PUZZLES[22], cache=cache)
+    # enigmatis2/tunnel_doors.py
+    Solver(starting_tile_position=tile_position, cache=cache).run()
+    # demon_hunter/eighteen_sum.py
+    solve(DEFAULT_CONFIG, cache=cache)
+
+The solvers don't import this module; they take anything with the same get()
+and put() methods. Each one saves its solutions under its own namespace, with
+a version number that gets bumped whenever a change to the solver means old
+solutions shouldn't be used any more.
+
+Entries are keyed by a fingerprint of the namespace, version and puzzle (see
+``fingerprint()``), and saved as JSON. Only the max_entries most recently used
+solutions are kept.
+"""
+
+import hashlib
+import json
+import sqlite3
+import time
+from typing import Any, Optional
+
+# How many solutions are kept by default, before the least recently used ones
+# are thrown out
+DEFAULT_MAX_ENTRIES = 10000
+# A solution's last-used time is only updated on a hit if it's older than this
+# (in seconds), so that looking up the same solutions over and over doesn't
+# mean a write every time
+TOUCH_INTERVAL = 60
+
+
+def fingerprint(namespace: str, version: int, key: Any) -> str:
+    """
+    A sha256 of the namespace, version, and key (as JSON with the dictionary
+    keys sorted and no extra whitespace, so equal puzzles always match)
+    """
+    canonical = json.dumps(
+        [namespace, version, key],
+        sort_keys=True,
+        separators=(',', ':'),
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class SolutionCache:
+    def __init__(self, path: str, max_entries: int=DEFAULT_MAX_ENTRIES):
+        self.path: str = path
+        self.max_entries: int = max_entries
+
+        # Autocommit, with a write-ahead log, so that the writes on hits (to
+        # keep track of when each solution was last used) stay cheap
+        self._connection = sqlite3.connect(
+            path,
+            timeout=30,
+            isolation_level=None,
+        )
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS solutions ('
+            '    fingerprint TEXT PRIMARY KEY,'
+            '    value TEXT NOT NULL,'
+            '    last_used REAL NOT NULL'
+            ')'
+        )
+        self._connection.execute(
+            'CREATE INDEX IF NOT EXISTS solutions_last_used '
+            'ON solutions (last_used)'
+        )
+
+    def __enter__(self) -> 'SolutionCache':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self) -> int:
+        return self._connection.execute(
+            'SELECT COUNT(*) FROM solutions'
+        ).fetchone()[0]
+
+    def get(self, namespace: str, version: int, key: Any) -> Optional[Any]:
+        """
+        The saved solution, or None if there isn't one
+        """
+        digest = fingerprint(namespace, version, key)
+        row = self._connection.execute(
+            'SELECT value, last_used FROM solutions WHERE fingerprint = ?',
+            (digest,),
+        ).fetchone()
+        if row is None:
+            return None
+
+        value, last_used = row
+        now = time.time()
+        if now - last_used > TOUCH_INTERVAL:
+            self._connection.execute(
+                'UPDATE solutions SET last_used = ? WHERE fingerprint = ?',
+                (now, digest),
+            )
+        return json.loads(value)
+
+    def put(self, namespace: str, version: int, key: Any, value: Any):
+        """
+        Saves a solution, which has to be JSON serializable (and not None,
+        since get() uses that for a solution that isn't saved). Throws out the
+        least recently used solutions if there are more than max_entries.
+        """
+        if value is None:
+            raise ValueError('None can not be saved in a SolutionCache')
+
+        with self._connection:
+            self._connection.execute('BEGIN IMMEDIATE')
+            self._connection.execute(
+                'INSERT OR REPLACE INTO solutions (fingerprint, value, last_used) '
+                'VALUES (?, ?, ?)',
+                (
+                    fingerprint(namespace, version, key),
+                    json.dumps(value, separators=(',', ':')),
+                    time.time(),
+                ),
+            )
+            self._connection.execute(
+                'DELETE FROM solutions WHERE fingerprint IN ('
+                '    SELECT fingerprint FROM solutions'
+                '    ORDER BY last_used DESC LIMIT -1 OFFSET ?'
+                ')',
+                (self.max_entries,),
+            )
+
+    def clear(self):
+        self._connection.execute('DELETE FROM solutions')
+
+    def close(self):
+        self._connection.close()